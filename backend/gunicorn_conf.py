@@ -0,0 +1,19 @@
+"""Gunicorn settings for running server:app with one uvicorn event loop per worker.
+
+    gunicorn -c gunicorn_conf.py server:app
+
+UvicornWorker picks uvloop and httptools automatically when they are installed.
+"""
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# One worker unless WEB_CONCURRENCY asks for more. Extra workers need REDIS_URL, which
+# carries room broadcasts and state between processes, and websocket-only clients.
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Socket.IO keeps websockets open for the whole class; don't recycle busy workers
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
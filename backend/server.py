@@ -1,17 +1,35 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
+import os
+# Motor sizes its worker pool at import time; a small pool avoids thread contention
+os.environ.setdefault('MOTOR_MAX_WORKERS', '4')
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import socketio
-import os
+import redis.asyncio as aioredis
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
-from typing import List, Optional
+from dataclasses import dataclass, asdict
+from typing import List, NamedTuple, Optional
 import uuid
+import secrets
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 from datetime import datetime, timezone, timedelta
 import jwt
+import orjson
+import hashlib
+import hmac
+import time
+from cachetools import TLRUCache, TTLCache
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
 from livekit import api
 
 ROOT_DIR = Path(__file__).parent
@@ -26,27 +44,121 @@ logger = logging.getLogger(__name__)
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, minPoolSize=10, maxPoolSize=50)
 db = client[os.environ['DB_NAME']]
 
 # LiveKit Configuration
 LIVEKIT_URL = os.environ.get('LIVEKIT_URL', '')
 LIVEKIT_API_KEY = os.environ.get('LIVEKIT_API_KEY', '')
 LIVEKIT_API_SECRET = os.environ.get('LIVEKIT_API_SECRET', '')
+LIVEKIT_HTTP_URL = LIVEKIT_URL.replace("wss://", "https://").replace("ws://", "http://")
+LIVEKIT_TOKEN_TTL = timedelta(hours=6)
+# Grants shared by every participant; room and room_admin are filled in per token
+LIVEKIT_GRANT_BASE = dict(room_join=True, can_publish=True, can_subscribe=True, can_publish_data=True)
+
+# Shared LiveKit server API client, created on first use so its HTTP session is reused
+livekit_api: Optional[api.LiveKitAPI] = None
 
-# In-memory room states for Socket.IO signaling
+# Redis (optional): shares Socket.IO fan-out and room state across workers
+REDIS_URL = os.environ.get('REDIS_URL')
+redis_client = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+
+# Room signaling state. With Redis every worker shares it through the room:{id}:* keys, which
+# expire ROOM_STATE_TTL after the last write so a crashed worker can't leave them behind;
+# without Redis it lives in room_states
 room_states = {}
+ROOM_KEY_PARTS = ("participants", "sids", "presentation")
+ROOM_STATE_TTL = 12 * 3600
+NO_PRESENTATION = {"current_presenter": None, "smartboard_content": None}
+
+# Chat messages awaiting a batched insert into MongoDB
+# Bounded, so a stalled database pushes back on send_message instead of growing memory
+MSG_QUEUE_LIMIT = 10000
+MSG_FLUSH_INTERVAL = 0.05
+MSG_FLUSH_BATCH = 100
+msg_queue: asyncio.Queue = asyncio.Queue(maxsize=MSG_QUEUE_LIMIT)
+
+# Participant field changes per room, coalesced into one participants_batch emit
+pending_updates: dict[str, dict[str, dict]] = {}
+UPDATE_COALESCE_WINDOW = 0.05
+flush_tasks: set = set()
+
+# Cached UTC timestamp for the health check, refreshed by clock_ticker; stored records call
+# utc_iso() themselves so timestamps order the way events happened
+CLOCK_TICK = 0.05
+
+def utc_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+now_iso = utc_iso()
+
+# room_id -> RoomMeta; the fields are immutable, the TTL only bounds memory for ended rooms
+room_meta_cache = TTLCache(maxsize=10000, ttl=3600)
+
+# Socket.IO sid -> {(room_id, user_id)} it joined, so disconnects resolve without scanning every room
+sid_index: dict[str, set[tuple[str, str]]] = {}
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'orbital-classroom-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
+JWT_ALGORITHMS = (JWT_ALGORITHM,)
+JWT_SECRET_BYTES = JWT_SECRET.encode()
+
+class OrjsonJWT(jwt.PyJWT):
+    """PyJWT with claims (de)serialized through orjson instead of the stdlib json module."""
+
+    def _encode_payload(self, payload, headers=None, json_encoder=None) -> bytes:
+        return orjson.dumps(payload)
+
+    def _decode_payload(self, decoded: dict) -> dict:
+        try:
+            payload = orjson.loads(decoded["payload"])
+        except orjson.JSONDecodeError as e:
+            raise jwt.DecodeError(f"Invalid payload string: {e}") from e
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
+        return payload
+
+# Shared codec with options merged once; every token we issue carries an exp claim
+jwt_codec = OrjsonJWT(options={"require": ["exp"]})
+
+# Decoded JWT payloads keyed by token digest; entries live at most 60s and never past `exp`
+JWT_CACHE_TTL = 60
+token_cache = TLRUCache(
+    maxsize=10000,
+    ttu=lambda _key, payload, now: min(now + JWT_CACHE_TTL, payload['exp']),
+    timer=time.time,
+)
 
 # Security
 security = HTTPBearer()
 
+# Password hashing (Argon2id, OWASP interactive parameters)
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+# Dedicated pool so hashing bursts cannot starve the loop's default executor (DNS lookups etc.)
+hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="hashing")
+
+# Recently verified credentials, keyed by HMAC(password, hash) so raw passwords are never stored
+verified_credentials = TTLCache(maxsize=4096, ttl=60)
+CREDENTIAL_CACHE_KEY = secrets.token_bytes(32)
+
+class SocketJSON:
+    """orjson-backed stand-in for the json module python-socketio encodes packets with."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    loads = staticmethod(orjson.loads)
+
 # Socket.IO setup
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
-fastapi_app = FastAPI(title="Orbital Classroom API")
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    json=SocketJSON,
+    client_manager=socketio.AsyncRedisManager(REDIS_URL) if REDIS_URL else None
+)
+fastapi_app = FastAPI(title="Orbital Classroom API", default_response_class=ORJSONResponse)
 
 # ==================== MODELS ====================
 
@@ -114,35 +226,334 @@ class MessageResponse(BaseModel):
     content: str
     timestamp: str
 
+@dataclass(slots=True)
+class Participant:
+    """In-memory signaling state for one participant in a room."""
+    id: str
+    user_id: str
+    name: str
+    role: str
+    is_muted: bool = True
+    is_video_on: bool = False
+    is_hand_raised: bool = False
+    is_presenting: bool = False
+
+class RoomMeta(NamedTuple):
+    """Fields of a room that never change after creation."""
+    host_id: str
+    livekit_room_name: str
+
 # ==================== HELPERS ====================
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+# Room reads are returned as plain dicts shaped like RoomResponse, skipping re-validation
+ROOM_RESPONSE_PROJECTION = {"_id": 0, **dict.fromkeys(RoomResponse.model_fields, 1)}
+ROOM_RESPONSE_DOCS = {200: {"model": RoomResponse}}
+# Teacher controls and LiveKit routes only need to authorize and resolve the LiveKit room
+ROOM_CONTROL_PROJECTION = {"_id": 0, "id": 1, "host_id": 1, "code": 1, "livekit_room_name": 1}
+MESSAGE_RESPONSE_PROJECTION = {"_id": 0, **dict.fromkeys(MessageResponse.model_fields, 1)}
+MESSAGE_HISTORY_LIMIT = 100
+
+def _verify_password_sync(password: str, hashed: str) -> bool:
+    # Accounts created before the Argon2 switch still carry bcrypt hashes
+    if hashed.startswith("$2"):
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    try:
+        return password_hasher.verify(hashed, password)
+    except (VerifyMismatchError, InvalidHashError):
+        return False
+
+def password_needs_rehash(hashed: str) -> bool:
+    return hashed.startswith("$2") or password_hasher.check_needs_rehash(hashed)
+
+async def hash_password(password: str) -> str:
+    # Argon2 releases the GIL, so worker threads hash in parallel while the event loop stays free
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, password_hasher.hash, password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+async def verify_password(password: str, hashed: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, _verify_password_sync, password, hashed)
+
+async def verify_password_cached(password: str, hashed: str) -> bool:
+    """verify_password, skipping the KDF for a pair that verified within the last minute."""
+    key = hmac.new(CREDENTIAL_CACHE_KEY, f"{password}\0{hashed}".encode(), hashlib.sha256).digest()
+    if key in verified_credentials:
+        return True
+    if not await verify_password(password, hashed):
+        return False
+    verified_credentials[key] = True
+    return True
 
 def create_token(user_id: str, email: str, name: str) -> str:
     payload = {
         'user_id': user_id,
         'email': email,
         'name': name,
-        'exp': datetime.now(timezone.utc).timestamp() + (24 * 60 * 60)
+        'exp': int(time.time()) + (24 * 60 * 60)
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt_codec.encode(payload, JWT_SECRET_BYTES, algorithm=JWT_ALGORITHM)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    cache_key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(cache_key)
+    if payload is not None:
+        return payload
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt_codec.decode(token, JWT_SECRET_BYTES, algorithms=JWT_ALGORITHMS)
+        token_cache[cache_key] = payload
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def clock_ticker():
+    global now_iso
+    while True:
+        now_iso = utc_iso()
+        await asyncio.sleep(CLOCK_TICK)
+
+async def insert_messages(batch: list):
+    try:
+        await db.messages.insert_many(batch, ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to persist {len(batch)} chat messages: {e}")
+
+async def flush_messages():
+    """Drain whatever is queued right now into a single insert_many."""
+    batch = [msg_queue.get_nowait() for _ in range(msg_queue.qsize())]
+    if batch:
+        await insert_messages(batch)
+
+async def message_flusher():
+    """Write queued messages once MSG_FLUSH_BATCH accumulate or MSG_FLUSH_INTERVAL passes."""
+    loop = asyncio.get_running_loop()
+    batch = []
+    try:
+        while True:
+            batch = [await msg_queue.get()]
+            deadline = loop.time() + MSG_FLUSH_INTERVAL
+            while len(batch) < MSG_FLUSH_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(msg_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await insert_messages(batch)
+            batch = []
+    except asyncio.CancelledError:
+        if batch:
+            await insert_messages(batch)
+        raise
+
+def new_room_state() -> dict:
+    return {
+        "participants": {},
+        # user_id -> sid of the socket that owns the participant, kept out of broadcast payloads
+        "sids": {},
+        "smartboard_content": None,
+        "current_presenter": None
+    }
+
+def room_meta(room: dict) -> RoomMeta:
+    return RoomMeta(
+        host_id=room["host_id"],
+        livekit_room_name=room.get("livekit_room_name", f"orbital-{room['code'].lower()}")
+    )
+
+def cache_room_meta(room: dict) -> RoomMeta:
+    meta = room_meta_cache[room["id"]] = room_meta(room)
+    return meta
+
+async def get_room_meta(room_id: str) -> Optional[RoomMeta]:
+    """Host and LiveKit room name for a room, loaded from MongoDB only on a cache miss."""
+    meta = room_meta_cache.get(room_id)
+    if meta is None:
+        room = await db.rooms.find_one({"id": room_id}, ROOM_CONTROL_PROJECTION)
+        if room:
+            meta = cache_room_meta(room)
+    return meta
+
+def queue_participant_update(room_id: str, user_id: str, changes: dict):
+    """Merge changes into the room's pending batch, scheduling a flush for the first one."""
+    room_updates = pending_updates.get(room_id)
+    if room_updates is None:
+        room_updates = pending_updates[room_id] = {}
+        task = asyncio.create_task(flush_participant_updates(room_id))
+        flush_tasks.add(task)
+        task.add_done_callback(flush_tasks.discard)
+    room_updates.setdefault(user_id, {"user_id": user_id}).update(changes)
+
+async def flush_participant_updates(room_id: str):
+    await asyncio.sleep(UPDATE_COALESCE_WINDOW)
+    updates = pending_updates.pop(room_id, None)
+    if updates:
+        await sio.emit('participants_batch', list(updates.values()), room=room_id)
+
+def room_key(room_id: str, part: str) -> str:
+    return f"room:{room_id}:{part}"
+
+# Release a participant only if the given sid still owns it; returns the participant JSON
+REMOVE_PARTICIPANT_LUA = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return false end
+redis.call('HDEL', KEYS[2], ARGV[1])
+local participant = redis.call('HGET', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[1], ARGV[1])
+return participant
+"""
+
+# Merge field changes into one stored participant in place, so concurrent writers never
+# overwrite each other's fields and an ended room is never written back. Writes refresh the
+# sids TTL too: if it lapsed first, every later ownership check would fail and leave ghosts
+UPDATE_PARTICIPANT_LUA = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then return false end
+local participant = cjson.decode(raw)
+for field, value in pairs(cjson.decode(ARGV[2])) do participant[field] = value end
+raw = cjson.encode(participant)
+redis.call('HSET', KEYS[1], ARGV[1], raw)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return raw
+"""
+
+MUTE_STUDENTS_LUA = """
+local entries = redis.call('HGETALL', KEYS[1])
+for i = 1, #entries, 2 do
+    local participant = cjson.decode(entries[i + 1])
+    if participant.role == 'student' then
+        participant.is_muted = true
+        redis.call('HSET', KEYS[1], entries[i], cjson.encode(participant))
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return #entries / 2
+"""
+
+if redis_client:
+    remove_participant_script = redis_client.register_script(REMOVE_PARTICIPANT_LUA)
+    update_participant_script = redis_client.register_script(UPDATE_PARTICIPANT_LUA)
+    mute_students_script = redis_client.register_script(MUTE_STUDENTS_LUA)
+
+def local_room_state(room_id: str) -> dict:
+    state = room_states.get(room_id)
+    if state is None:
+        state = room_states[room_id] = new_room_state()
+    return state
+
+async def add_participant(room_id: str, participant: Participant, sid: str):
+    """Store a participant and record sid as the socket that owns it."""
+    if redis_client:
+        participants, sids = room_key(room_id, "participants"), room_key(room_id, "sids")
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(participants, participant.user_id, orjson.dumps(asdict(participant)))
+            pipe.hset(sids, participant.user_id, sid)
+            pipe.expire(participants, ROOM_STATE_TTL)
+            pipe.expire(sids, ROOM_STATE_TTL)
+            await pipe.execute()
+        return
+    state = local_room_state(room_id)
+    state["participants"][participant.user_id] = participant
+    state["sids"][participant.user_id] = sid
+
+async def update_participant(room_id: str, user_id: str, **changes) -> Optional[Participant]:
+    """Apply field changes to a participant, returning the updated participant if it exists."""
+    if redis_client:
+        raw = await update_participant_script(
+            keys=[room_key(room_id, "participants"), room_key(room_id, "sids")],
+            args=[user_id, orjson.dumps(changes), ROOM_STATE_TTL]
+        )
+        return Participant(**orjson.loads(raw)) if raw else None
+    state = room_states.get(room_id)
+    participant = state["participants"].get(user_id) if state else None
+    if participant:
+        for field, value in changes.items():
+            setattr(participant, field, value)
+    return participant
+
+async def remove_participant(room_id: str, user_id: str, sid: str) -> Optional[Participant]:
+    """Remove a participant if this socket still owns it; a rejoin on a new socket takes over."""
+    if redis_client:
+        raw = await remove_participant_script(
+            keys=[room_key(room_id, "participants"), room_key(room_id, "sids")],
+            args=[user_id, sid]
+        )
+        return Participant(**orjson.loads(raw)) if raw else None
+    state = room_states.get(room_id)
+    if not state or state["sids"].get(user_id) != sid:
+        return None
+    del state["sids"][user_id]
+    return state["participants"].pop(user_id, None)
+
+async def mute_students(room_id: str):
+    if redis_client:
+        await mute_students_script(
+            keys=[room_key(room_id, "participants"), room_key(room_id, "sids")],
+            args=[ROOM_STATE_TTL]
+        )
+        return
+    state = room_states.get(room_id)
+    for participant in state["participants"].values() if state else ():
+        if participant.role == "student":
+            participant.is_muted = True
+
+async def load_participants(room_id: str) -> list:
+    """Return every participant in the room, across all workers when Redis is configured."""
+    if redis_client:
+        return [orjson.loads(p) for p in await redis_client.hvals(room_key(room_id, "participants"))]
+    if room_id not in room_states:
+        return []
+    return [asdict(p) for p in room_states[room_id]["participants"].values()]
+
+async def get_presentation(room_id: str) -> dict:
+    """Current presenter and smartboard content of a room."""
+    if redis_client:
+        raw = await redis_client.get(room_key(room_id, "presentation"))
+        return orjson.loads(raw) if raw else dict(NO_PRESENTATION)
+    state = room_states.get(room_id)
+    return {field: state[field] for field in NO_PRESENTATION} if state else dict(NO_PRESENTATION)
+
+async def set_presentation(room_id: str, current_presenter: Optional[str], smartboard_content: Optional[str]):
+    if redis_client:
+        key = room_key(room_id, "presentation")
+        if current_presenter is None:
+            await redis_client.delete(key)
+        else:
+            await redis_client.set(key, orjson.dumps({
+                "current_presenter": current_presenter,
+                "smartboard_content": smartboard_content
+            }), ex=ROOM_STATE_TTL)
+        return
+    state = local_room_state(room_id)
+    state["current_presenter"] = current_presenter
+    state["smartboard_content"] = smartboard_content
+
+async def delete_room_state(room_id: str):
+    room_states.pop(room_id, None)
+    if redis_client:
+        await redis_client.delete(*(room_key(room_id, part) for part in ROOM_KEY_PARTS))
+
+ROOM_CODE_ATTEMPTS = 5
+# Maps RFC 4648 base32 onto Crockford's alphabet, which has no I, L, O or U to misread
+ROOM_CODE_ALPHABET = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ234567", "0123456789ABCDEFGHJKMNPQRSTVWXYZ")
+
+def get_livekit_api() -> api.LiveKitAPI:
+    global livekit_api
+    if livekit_api is None:
+        livekit_api = api.LiveKitAPI(
+            url=LIVEKIT_HTTP_URL,
+            api_key=LIVEKIT_API_KEY,
+            api_secret=LIVEKIT_API_SECRET
+        )
+    return livekit_api
+
 def generate_room_code() -> str:
-    return str(uuid.uuid4())[:8].upper()
+    # 40 random bits encode to exactly 8 base32 characters, no padding
+    return base64.b32encode(secrets.token_bytes(5)).decode().translate(ROOM_CODE_ALPHABET)
 
 def create_livekit_token(room_name: str, participant_identity: str, participant_name: str, is_teacher: bool) -> str:
     """Generate LiveKit access token with role-based permissions."""
@@ -152,16 +563,13 @@ def create_livekit_token(room_name: str, participant_identity: str, participant_
     
     # Grant permissions based on role
     grant = api.VideoGrants(
-        room_join=True,
+        **LIVEKIT_GRANT_BASE,
         room=room_name,
-        can_publish=True,
-        can_subscribe=True,
-        can_publish_data=True,
         room_admin=is_teacher,  # Teachers can manage the room
     )
     
     token.with_grants(grant)
-    token.with_ttl(timedelta(hours=6))  # 6 hour validity
+    token.with_ttl(LIVEKIT_TOKEN_TTL)
     
     return token.to_jwt()
 
@@ -169,19 +577,23 @@ def create_livekit_token(room_name: str, participant_identity: str, participant_
 
 @fastapi_app.post("/api/auth/register", response_model=dict)
 async def register(user: UserCreate):
-    existing = await db.users.find_one({"email": user.email}, {"_id": 0})
-    if existing:
+    # Cheap check first so a taken email never pays for a password hash;
+    # the unique index still catches a concurrent registration
+    if await db.users.find_one({"email": user.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user_id = str(uuid.uuid4())
     user_doc = {
         "id": user_id,
         "email": user.email,
-        "password": hash_password(user.password),
+        "password": await hash_password(user.password),
         "name": user.name,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": utc_iso()
     }
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     token = create_token(user_id, user.email, user.name)
     return {
@@ -195,10 +607,19 @@ async def register(user: UserCreate):
 
 @fastapi_app.post("/api/auth/login", response_model=dict)
 async def login(credentials: UserLogin):
-    user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password"]):
+    user = await db.users.find_one(
+        {"email": credentials.email},
+        {"_id": 0, "id": 1, "email": 1, "name": 1, "password": 1}
+    )
+    if not user or not await verify_password_cached(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    if password_needs_rehash(user["password"]):
+        await db.users.update_one(
+            {"id": user["id"]},
+            {"$set": {"password": await hash_password(credentials.password)}}
+        )
+    
     token = create_token(user["id"], user["email"], user["name"])
     return {
         "token": token,
@@ -219,61 +640,65 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 
 # ==================== ROOM ROUTES ====================
 
-@fastapi_app.post("/api/rooms", response_model=RoomResponse)
+@fastapi_app.post("/api/rooms", response_model=None, responses=ROOM_RESPONSE_DOCS)
 async def create_room(room: RoomCreate, current_user: dict = Depends(get_current_user)):
     room_id = str(uuid.uuid4())
-    room_code = generate_room_code()
-    livekit_room_name = f"orbital-{room_code.lower()}"
-    
-    room_doc = {
-        "id": room_id,
-        "name": room.name,
-        "code": room_code,
-        "livekit_room_name": livekit_room_name,
-        "host_id": current_user["user_id"],
-        "host_name": current_user["name"],
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "is_active": True
-    }
-    await db.rooms.insert_one(room_doc)
     
-    # Initialize room state for signaling
-    room_states[room_id] = {
-        "participants": {},
-        "messages": [],
-        "smartboard_content": None
-    }
+    # The unique index on rooms.code rejects collisions; retry with a fresh code
+    for _ in range(ROOM_CODE_ATTEMPTS):
+        room_code = generate_room_code()
+        room_doc = {
+            "id": room_id,
+            "name": room.name,
+            "code": room_code,
+            "livekit_room_name": f"orbital-{room_code.lower()}",
+            "host_id": current_user["user_id"],
+            "host_name": current_user["name"],
+            "created_at": utc_iso(),
+            "is_active": True
+        }
+        try:
+            await db.rooms.insert_one(room_doc)
+            break
+        except DuplicateKeyError:
+            continue
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate a room code")
+    
+    cache_room_meta(room_doc)
     
-    return RoomResponse(**room_doc)
+    return {field: room_doc[field] for field in RoomResponse.model_fields}
 
-@fastapi_app.post("/api/rooms/join", response_model=RoomResponse)
+@fastapi_app.post("/api/rooms/join", response_model=None, responses=ROOM_RESPONSE_DOCS)
 async def join_room(join_data: RoomJoin, current_user: dict = Depends(get_current_user)):
-    room = await db.rooms.find_one({"code": join_data.code.upper(), "is_active": True}, {"_id": 0})
+    room = await db.rooms.find_one(
+        {"code": join_data.code.upper(), "is_active": True}, ROOM_RESPONSE_PROJECTION
+    )
     if not room:
         raise HTTPException(status_code=404, detail="Room not found or inactive")
     
-    return RoomResponse(**room)
+    return room
 
-@fastapi_app.get("/api/rooms/{room_id}", response_model=RoomResponse)
+@fastapi_app.get("/api/rooms/{room_id}", response_model=None, responses=ROOM_RESPONSE_DOCS)
 async def get_room(room_id: str, current_user: dict = Depends(get_current_user)):
-    room = await db.rooms.find_one({"id": room_id}, {"_id": 0})
+    room = await db.rooms.find_one({"id": room_id}, ROOM_RESPONSE_PROJECTION)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
-    return RoomResponse(**room)
+    return room
 
 # ==================== LIVEKIT TOKEN ROUTES ====================
 
 @fastapi_app.post("/api/livekit/token", response_model=LiveKitTokenResponse)
 async def get_livekit_token(request: LiveKitTokenRequest, current_user: dict = Depends(get_current_user)):
     """Generate LiveKit access token for joining a room with real audio/video."""
-    room = await db.rooms.find_one({"id": request.room_id}, {"_id": 0})
+    room = await get_room_meta(request.room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    is_teacher = room["host_id"] == current_user["user_id"]
+    is_teacher = room.host_id == current_user["user_id"]
     participant_identity = current_user["user_id"]
     participant_name = current_user["name"]
-    livekit_room_name = room.get("livekit_room_name", f"orbital-{room['code'].lower()}")
+    livekit_room_name = room.livekit_room_name
     
     # Generate LiveKit token
     livekit_token = create_livekit_token(
@@ -295,49 +720,45 @@ async def get_livekit_token(request: LiveKitTokenRequest, current_user: dict = D
 @fastapi_app.post("/api/rooms/{room_id}/mute-all")
 async def mute_all_students(room_id: str, current_user: dict = Depends(get_current_user)):
     """Mute all student microphones at the LiveKit media level."""
-    room = await db.rooms.find_one({"id": room_id}, {"_id": 0})
+    room = await get_room_meta(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    if room["host_id"] != current_user["user_id"]:
+    if room.host_id != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Only teacher can mute all")
     
-    livekit_room_name = room.get("livekit_room_name", f"orbital-{room['code'].lower()}")
+    livekit_room_name = room.livekit_room_name
     
     try:
-        lkapi = api.LiveKitAPI(
-            url=LIVEKIT_URL.replace("wss://", "https://").replace("ws://", "http://"),
-            api_key=LIVEKIT_API_KEY,
-            api_secret=LIVEKIT_API_SECRET
-        )
+        lkapi = get_livekit_api()
         
         # Get list of participants
         participants_response = await lkapi.room.list_participants(
             api.ListParticipantsRequest(room=livekit_room_name)
         )
         
-        muted_count = 0
         teacher_id = current_user["user_id"]
         
-        for participant in participants_response.participants:
-            # Skip the teacher
-            if participant.identity == teacher_id:
-                continue
-            
-            # Mute all audio tracks for this participant
-            for track in participant.tracks:
-                if track.type == api.TrackType.AUDIO:
-                    await lkapi.room.mute_published_track(
-                        api.MuteRoomTrackRequest(
-                            room=livekit_room_name,
-                            identity=participant.identity,
-                            track_sid=track.sid,
-                            muted=True
-                        )
-                    )
-                    muted_count += 1
+        # Mute every student audio track concurrently (the teacher is skipped)
+        results = await asyncio.gather(*(
+            lkapi.room.mute_published_track(
+                api.MuteRoomTrackRequest(
+                    room=livekit_room_name,
+                    identity=participant.identity,
+                    track_sid=track.sid,
+                    muted=True
+                )
+            )
+            for participant in participants_response.participants
+            if participant.identity != teacher_id
+            for track in participant.tracks
+            if track.type == api.TrackType.AUDIO
+        ), return_exceptions=True)
         
-        await lkapi.aclose()
+        failures = [r for r in results if isinstance(r, Exception)]
+        for failure in failures:
+            logger.warning(f"Failed to mute track: {failure}")
+        muted_count = len(results) - len(failures)
         
         # Notify via Socket.IO
         await sio.emit('all_muted', {"room_id": room_id}, room=room_id)
@@ -355,38 +776,35 @@ async def mute_all_students(room_id: str, current_user: dict = Depends(get_curre
 @fastapi_app.post("/api/rooms/{room_id}/unmute-participant/{participant_id}")
 async def unmute_participant(room_id: str, participant_id: str, current_user: dict = Depends(get_current_user)):
     """Unmute a specific participant's microphone."""
-    room = await db.rooms.find_one({"id": room_id}, {"_id": 0})
+    room = await get_room_meta(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    if room["host_id"] != current_user["user_id"]:
+    if room.host_id != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Only teacher can unmute participants")
     
-    livekit_room_name = room.get("livekit_room_name", f"orbital-{room['code'].lower()}")
+    livekit_room_name = room.livekit_room_name
     
     try:
-        lkapi = api.LiveKitAPI(
-            url=LIVEKIT_URL.replace("wss://", "https://").replace("ws://", "http://"),
-            api_key=LIVEKIT_API_KEY,
-            api_secret=LIVEKIT_API_SECRET
-        )
+        lkapi = get_livekit_api()
         
         participant = await lkapi.room.get_participant(
             api.RoomParticipantIdentity(room=livekit_room_name, identity=participant_id)
         )
         
-        for track in participant.tracks:
-            if track.type == api.TrackType.AUDIO:
-                await lkapi.room.mute_published_track(
-                    api.MuteRoomTrackRequest(
-                        room=livekit_room_name,
-                        identity=participant_id,
-                        track_sid=track.sid,
-                        muted=False
-                    )
+        await asyncio.gather(*(
+            lkapi.room.mute_published_track(
+                api.MuteRoomTrackRequest(
+                    room=livekit_room_name,
+                    identity=participant_id,
+                    track_sid=track.sid,
+                    muted=False
                 )
+            )
+            for track in participant.tracks
+            if track.type == api.TrackType.AUDIO
+        ))
         
-        await lkapi.aclose()
         return {"success": True, "message": "Participant unmuted"}
     
     except Exception as e:
@@ -396,25 +814,19 @@ async def unmute_participant(room_id: str, participant_id: str, current_user: di
 @fastapi_app.get("/api/rooms/{room_id}/livekit-participants")
 async def get_livekit_participants(room_id: str, current_user: dict = Depends(get_current_user)):
     """Get real-time participant list from LiveKit."""
-    room = await db.rooms.find_one({"id": room_id}, {"_id": 0})
+    room = await get_room_meta(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    livekit_room_name = room.get("livekit_room_name", f"orbital-{room['code'].lower()}")
+    livekit_room_name = room.livekit_room_name
     
     try:
-        lkapi = api.LiveKitAPI(
-            url=LIVEKIT_URL.replace("wss://", "https://").replace("ws://", "http://"),
-            api_key=LIVEKIT_API_KEY,
-            api_secret=LIVEKIT_API_SECRET
-        )
+        lkapi = get_livekit_api()
         
         participants_response = await lkapi.room.list_participants(
             api.ListParticipantsRequest(room=livekit_room_name)
         )
         
-        await lkapi.aclose()
-        
         participants = []
         for p in participants_response.participants:
             is_muted = True
@@ -427,7 +839,7 @@ async def get_livekit_participants(room_id: str, current_user: dict = Depends(ge
                 "identity": p.identity,
                 "name": p.name,
                 "is_muted": is_muted,
-                "is_teacher": p.identity == room["host_id"],
+                "is_teacher": p.identity == room.host_id,
                 "joined_at": p.joined_at
             })
         
@@ -437,56 +849,58 @@ async def get_livekit_participants(room_id: str, current_user: dict = Depends(ge
         logger.error(f"Failed to get participants: {e}")
         return {"participants": []}
 
-@fastapi_app.get("/api/rooms/{room_id}/participants", response_model=List[ParticipantResponse])
+@fastapi_app.get(
+    "/api/rooms/{room_id}/participants",
+    response_model=None,
+    responses={200: {"model": List[ParticipantResponse]}}
+)
 async def get_participants(room_id: str, current_user: dict = Depends(get_current_user)):
-    if room_id not in room_states:
-        return []
-    
-    participants = list(room_states[room_id]["participants"].values())
-    return participants
+    return await load_participants(room_id)
 
 @fastapi_app.get("/api/rooms/{room_id}/messages", response_model=List[MessageResponse])
 async def get_messages(room_id: str, current_user: dict = Depends(get_current_user)):
-    messages = await db.messages.find({"room_id": room_id}, {"_id": 0}).sort("timestamp", 1).to_list(100)
+    messages = await db.messages.find(
+        {"room_id": room_id}, MESSAGE_RESPONSE_PROJECTION
+    ).sort("timestamp", 1).limit(MESSAGE_HISTORY_LIMIT).to_list(MESSAGE_HISTORY_LIMIT)
     return messages
 
 @fastapi_app.delete("/api/rooms/{room_id}")
 async def end_room(room_id: str, current_user: dict = Depends(get_current_user)):
-    room = await db.rooms.find_one({"id": room_id}, {"_id": 0})
+    # Authorize and deactivate in one round trip; only a miss needs a second lookup
+    room = await db.rooms.find_one_and_update(
+        {"id": room_id, "host_id": current_user["user_id"]},
+        {"$set": {"is_active": False}},
+        projection=ROOM_CONTROL_PROJECTION
+    )
     if not room:
+        if await get_room_meta(room_id):
+            raise HTTPException(status_code=403, detail="Only host can end the room")
         raise HTTPException(status_code=404, detail="Room not found")
     
-    if room["host_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Only host can end the room")
-    
-    await db.rooms.update_one({"id": room_id}, {"$set": {"is_active": False}})
-    
     # Delete LiveKit room
-    livekit_room_name = room.get("livekit_room_name", f"orbital-{room['code'].lower()}")
+    livekit_room_name = room_meta(room).livekit_room_name
     try:
-        lkapi = api.LiveKitAPI(
-            url=LIVEKIT_URL.replace("wss://", "https://").replace("ws://", "http://"),
-            api_key=LIVEKIT_API_KEY,
-            api_secret=LIVEKIT_API_SECRET
-        )
+        lkapi = get_livekit_api()
         await lkapi.room.delete_room(api.DeleteRoomRequest(room=livekit_room_name))
-        await lkapi.aclose()
     except Exception as e:
         logger.warning(f"Failed to delete LiveKit room: {e}")
     
     await sio.emit('room_ended', {"room_id": room_id}, room=room_id)
     
-    if room_id in room_states:
-        del room_states[room_id]
+    room_meta_cache.pop(room_id, None)
+    await delete_room_state(room_id)
     
     return {"message": "Room ended successfully"}
 
 @fastapi_app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+    return {"status": "healthy", "timestamp": now_iso}
 
 # ==================== SOCKET.IO EVENTS ====================
 
+# Participant flags a client may set through bulk_update
+BULK_UPDATE_FIELDS = ("is_muted", "is_video_on", "is_hand_raised")
+
 @sio.event
 async def connect(sid, environ):
     logger.info(f"Client connected: {sid}")
@@ -494,15 +908,13 @@ async def connect(sid, environ):
 @sio.event
 async def disconnect(sid):
     logger.info(f"Client disconnected: {sid}")
-    for room_id, state in room_states.items():
-        for user_id, participant in list(state["participants"].items()):
-            if participant.get("sid") == sid:
-                del state["participants"][user_id]
-                await sio.emit('participant_left', {
-                    "user_id": user_id,
-                    "name": participant["name"]
-                }, room=room_id)
-                break
+    for room_id, user_id in sid_index.pop(sid, ()):
+        participant = await remove_participant(room_id, user_id, sid)
+        if participant:
+            await sio.emit('participant_left', {
+                "user_id": user_id,
+                "name": participant.name
+            }, room=room_id)
 
 @sio.event
 async def join_room(sid, data):
@@ -515,33 +927,18 @@ async def join_room(sid, data):
     
     await sio.enter_room(sid, room_id)
     
-    if room_id not in room_states:
-        room_states[room_id] = {
-            "participants": {},
-            "messages": [],
-            "smartboard_content": None
-        }
+    room = await get_room_meta(room_id)
+    role = "teacher" if room and room.host_id == user_id else "student"
     
-    room = await db.rooms.find_one({"id": room_id}, {"_id": 0})
-    role = "teacher" if room and room.get("host_id") == user_id else "student"
+    participant = Participant(id=str(uuid.uuid4()), user_id=user_id, name=name, role=role)
+    await add_participant(room_id, participant, sid)
+    sid_index.setdefault(sid, set()).add((room_id, user_id))
     
-    participant = {
-        "id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "name": name,
-        "role": role,
-        "is_muted": True,
-        "is_video_on": False,
-        "is_hand_raised": False,
-        "is_presenting": False,
-        "sid": sid
-    }
-    room_states[room_id]["participants"][user_id] = participant
-    
-    await sio.emit('participant_joined', participant, room=room_id)
+    await sio.emit('participant_joined', asdict(participant), room=room_id)
+    participants, presentation = await asyncio.gather(load_participants(room_id), get_presentation(room_id))
     await sio.emit('room_state', {
-        "participants": list(room_states[room_id]["participants"].values()),
-        "smartboard_content": room_states[room_id]["smartboard_content"]
+        "participants": participants,
+        "smartboard_content": presentation["smartboard_content"]
     }, to=sid)
 
 @sio.event
@@ -549,13 +946,20 @@ async def leave_room(sid, data):
     room_id = data.get("room_id")
     user_id = data.get("user_id")
     
-    if room_id and room_id in room_states:
-        participant = room_states[room_id]["participants"].pop(user_id, None)
-        if participant:
-            await sio.emit('participant_left', {
-                "user_id": user_id,
-                "name": participant["name"]
-            }, room=room_id)
+    if not room_id or not user_id:
+        return
+    
+    joined = sid_index.get(sid)
+    if joined:
+        joined.discard((room_id, user_id))
+        if not joined:
+            del sid_index[sid]
+    participant = await remove_participant(room_id, user_id, sid)
+    if participant:
+        await sio.emit('participant_left', {
+            "user_id": user_id,
+            "name": participant.name
+        }, room=room_id)
     
     await sio.leave_room(sid, room_id)
 
@@ -565,12 +969,11 @@ async def toggle_mute(sid, data):
     user_id = data.get("user_id")
     is_muted = data.get("is_muted")
     
-    if room_id in room_states and user_id in room_states[room_id]["participants"]:
-        room_states[room_id]["participants"][user_id]["is_muted"] = is_muted
-        await sio.emit('participant_updated', {
-            "user_id": user_id,
-            "is_muted": is_muted
-        }, room=room_id)
+    if not room_id or not user_id:
+        return
+    
+    if await update_participant(room_id, user_id, is_muted=is_muted):
+        queue_participant_update(room_id, user_id, {"is_muted": is_muted})
 
 @sio.event
 async def toggle_video(sid, data):
@@ -578,12 +981,11 @@ async def toggle_video(sid, data):
     user_id = data.get("user_id")
     is_video_on = data.get("is_video_on")
     
-    if room_id in room_states and user_id in room_states[room_id]["participants"]:
-        room_states[room_id]["participants"][user_id]["is_video_on"] = is_video_on
-        await sio.emit('participant_updated', {
-            "user_id": user_id,
-            "is_video_on": is_video_on
-        }, room=room_id)
+    if not room_id or not user_id:
+        return
+    
+    if await update_participant(room_id, user_id, is_video_on=is_video_on):
+        queue_participant_update(room_id, user_id, {"is_video_on": is_video_on})
 
 @sio.event
 async def raise_hand(sid, data):
@@ -591,14 +993,31 @@ async def raise_hand(sid, data):
     user_id = data.get("user_id")
     is_hand_raised = data.get("is_hand_raised")
     
-    if room_id in room_states and user_id in room_states[room_id]["participants"]:
-        room_states[room_id]["participants"][user_id]["is_hand_raised"] = is_hand_raised
-        name = room_states[room_id]["participants"][user_id]["name"]
-        await sio.emit('hand_raised', {
-            "user_id": user_id,
-            "name": name,
-            "is_hand_raised": is_hand_raised
-        }, room=room_id)
+    if not room_id or not user_id:
+        return
+    
+    participant = await update_participant(room_id, user_id, is_hand_raised=is_hand_raised)
+    if participant:
+        queue_participant_update(room_id, user_id, {"name": participant.name, "is_hand_raised": is_hand_raised})
+
+@sio.event
+async def bulk_update(sid, data):
+    room_id = data.get("room_id")
+    user_id = data.get("user_id")
+    
+    if not room_id or not user_id:
+        return
+    
+    # Later entries win, so a burst of toggles lands as one save and one broadcast
+    changes = {}
+    for update in data.get("updates") or ():
+        changes.update((field, update[field]) for field in BULK_UPDATE_FIELDS if field in update)
+    if not changes:
+        return
+    
+    participant = await update_participant(room_id, user_id, **changes)
+    if participant:
+        queue_participant_update(room_id, user_id, {"name": participant.name, **changes})
 
 @sio.event
 async def send_message(sid, data):
@@ -616,11 +1035,12 @@ async def send_message(sid, data):
         "user_id": user_id,
         "user_name": user_name,
         "content": content,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": utc_iso()
     }
     
-    await db.messages.insert_one(message.copy())
     await sio.emit('new_message', message, room=room_id)
+    # Queued only after the broadcast: insert_many adds `_id` to the dict in place
+    await msg_queue.put(message)
 
 @sio.event
 async def start_presenting(sid, data):
@@ -628,47 +1048,50 @@ async def start_presenting(sid, data):
     user_id = data.get("user_id")
     content_url = data.get("content_url")
     
-    if room_id in room_states:
-        for uid, p in room_states[room_id]["participants"].items():
-            p["is_presenting"] = False
-        
-        if user_id in room_states[room_id]["participants"]:
-            room_states[room_id]["participants"][user_id]["is_presenting"] = True
-            room_states[room_id]["smartboard_content"] = content_url
-            
-            await sio.emit('presentation_started', {
-                "user_id": user_id,
-                "name": room_states[room_id]["participants"][user_id]["name"],
-                "content_url": content_url
-            }, room=room_id)
+    if not room_id or not user_id:
+        return
+    
+    participant = await update_participant(room_id, user_id, is_presenting=True)
+    if not participant:
+        return
+    
+    previous = (await get_presentation(room_id))["current_presenter"]
+    if previous and previous != user_id:
+        await update_participant(room_id, previous, is_presenting=False)
+    await set_presentation(room_id, user_id, content_url)
+    
+    await sio.emit('presentation_started', {
+        "user_id": user_id,
+        "name": participant.name,
+        "content_url": content_url
+    }, room=room_id)
 
 @sio.event
 async def stop_presenting(sid, data):
     room_id = data.get("room_id")
     user_id = data.get("user_id")
     
-    if room_id in room_states:
-        if user_id in room_states[room_id]["participants"]:
-            room_states[room_id]["participants"][user_id]["is_presenting"] = False
-        room_states[room_id]["smartboard_content"] = None
-        
-        await sio.emit('presentation_stopped', {"user_id": user_id}, room=room_id)
+    if not room_id:
+        return
+    
+    presenter = (await get_presentation(room_id))["current_presenter"]
+    if presenter:
+        await update_participant(room_id, presenter, is_presenting=False)
+    await set_presentation(room_id, None, None)
+    
+    await sio.emit('presentation_stopped', {"user_id": user_id}, room=room_id)
 
 @sio.event
 async def mute_all(sid, data):
     room_id = data.get("room_id")
     host_id = data.get("host_id")
     
-    room = await db.rooms.find_one({"id": room_id}, {"_id": 0})
-    if not room or room["host_id"] != host_id:
+    room = await get_room_meta(room_id)
+    if not room or room.host_id != host_id:
         return
     
-    if room_id in room_states:
-        for user_id, participant in room_states[room_id]["participants"].items():
-            if participant["role"] == "student":
-                participant["is_muted"] = True
-        
-        await sio.emit('all_muted', {"room_id": room_id}, room=room_id)
+    await mute_students(room_id)
+    await sio.emit('all_muted', {"room_id": room_id}, room=room_id)
 
 # ==================== APP SETUP ====================
 
@@ -685,6 +1108,41 @@ fastapi_app.add_middleware(
 socket_app = socketio.ASGIApp(sio, other_asgi_app=fastapi_app, socketio_path='/api/socket.io')
 app = socket_app
 
+@fastapi_app.on_event("startup")
+async def warm_db_pool():
+    # Open pooled connections before the first request has to pay the handshake
+    await db.command("ping")
+
+@fastapi_app.on_event("startup")
+async def create_indexes():
+    indexes = (
+        (db.users, "email", True),
+        (db.rooms, "code", True),
+        (db.rooms, "id", True),
+        (db.messages, [("room_id", 1), ("timestamp", 1)], False),
+    )
+    for collection, keys, unique in indexes:
+        try:
+            await collection.create_index(keys, unique=unique)
+        except OperationFailure as e:
+            # Existing duplicates block a unique index; keep serving instead of failing startup
+            logger.error(f"Could not create index {keys} on {collection.name}, remove duplicates and restart: {e}")
+
+@fastapi_app.on_event("startup")
+async def start_background_tasks():
+    fastapi_app.state.clock_ticker = asyncio.create_task(clock_ticker())
+    fastapi_app.state.message_flusher = asyncio.create_task(message_flusher())
+
 @fastapi_app.on_event("shutdown")
 async def shutdown_db_client():
+    fastapi_app.state.clock_ticker.cancel()
+    fastapi_app.state.message_flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await fastapi_app.state.message_flusher
+    await flush_messages()
     client.close()
+    hash_executor.shutdown(wait=False)
+    if livekit_api:
+        await livekit_api.aclose()
+    if redis_client:
+        await redis_client.aclose()
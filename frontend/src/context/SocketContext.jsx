@@ -25,7 +25,8 @@ export const SocketProvider = ({ children }) => {
 
     socketRef.current = io(BACKEND_URL, {
       path: SOCKET_PATH,
-      transports: ['websocket', 'polling'],
+      // Long-polling needs sticky sessions, which multiple backend workers don't provide
+      transports: ['websocket'],
     });
 
     socketRef.current.on('connect', () => {
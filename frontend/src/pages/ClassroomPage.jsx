@@ -99,16 +99,16 @@ const ClassroomPage = () => {
       toast.info(`${data.name} left`);
     };
 
-    const handleParticipantUpdated = (data) => {
+    const handleParticipantsBatch = (updates) => {
+      const changes = new Map(updates.map(u => [u.user_id, u]));
       setParticipants(prev => prev.map(p => 
-        p.user_id === data.user_id ? { ...p, ...data } : p
+        changes.has(p.user_id) ? { ...p, ...changes.get(p.user_id) } : p
       ));
-    };
-
-    const handleHandRaised = (data) => {
-      if (data.user_id !== user.id && data.is_hand_raised) {
-        toast.info(`${data.name} raised their hand`);
-      }
+      updates.forEach(u => {
+        if (u.user_id !== user.id && u.is_hand_raised) {
+          toast.info(`${u.name} raised their hand`);
+        }
+      });
     };
 
     const handleNewMessage = (message) => {
@@ -129,8 +129,7 @@ const ClassroomPage = () => {
     on('room_state', handleRoomState);
     on('participant_joined', handleParticipantJoined);
     on('participant_left', handleParticipantLeft);
-    on('participant_updated', handleParticipantUpdated);
-    on('hand_raised', handleHandRaised);
+    on('participants_batch', handleParticipantsBatch);
     on('new_message', handleNewMessage);
     on('all_muted', handleAllMuted);
     on('room_ended', handleRoomEnded);
@@ -140,8 +139,7 @@ const ClassroomPage = () => {
       off('room_state', handleRoomState);
       off('participant_joined', handleParticipantJoined);
       off('participant_left', handleParticipantLeft);
-      off('participant_updated', handleParticipantUpdated);
-      off('hand_raised', handleHandRaised);
+      off('participants_batch', handleParticipantsBatch);
       off('new_message', handleNewMessage);
       off('all_muted', handleAllMuted);
       off('room_ended', handleRoomEnded);
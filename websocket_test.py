@@ -1,17 +1,57 @@
 import socketio
 import asyncio
 import json
+import orjson
+import re
+import resource
+import statistics
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor
+import websockets
+from collections import Counter, defaultdict, deque
+from functools import partial
+from types import SimpleNamespace
 import sys
 
+# Long-lived clients shared by the suites that don't need fresh connections
+POOL_SIZE = 4
+
+# Join payloads for the fixed users of the broadcast and collaboration suites
+BROADCAST_USERS = tuple(
+    {'room_id': 'broadcast_room', 'user_id': f'broadcast_user_{i}', 'name': f'Broadcast User {i}'}
+    for i in (1, 2)
+)
+COLLAB_USERS = tuple(
+    {'room_id': 'collaboration_room', 'user_id': f'collab_user_{i}', 'name': f'Collab User {i}'}
+    for i in range(3)
+)
+
+# Sequential toggles timed by the latency check in test_performance
+LATENCY_SAMPLES = 20
+
+# Concurrent sockets opened by the stress test, and the open-file limit it asks for
+STRESS_CLIENTS = 500
+STRESS_NOFILE = 8192
+
+# orjson codec for the clients' json option; python-socketio wants dumps to return str
+SOCKET_JSON = SimpleNamespace(dumps=lambda obj, *args, **kwargs: orjson.dumps(obj).decode(), loads=orjson.loads)
+
+# Server events every client records
+SOCKET_EVENTS = ('participant_joined', 'participant_left', 'participants_batch', 'new_message', 'room_state')
+
 class WebSocketTester:
     def __init__(self, base_url="https://virtual-classroom-28.preview.emergentagent.com"):
         self.base_url = base_url
         self.socket_path = '/api/socket.io'
         self.clients = []
-        self.events_received = []
+        self.client_ids = {}
+        self._idle = []
+        self._joins = defaultdict(list)
+        # Per-client queues of raw event payloads, awaited by _expect; event_log keeps a bounded
+        # per-event history of (client_id, data) and event_counts the full totals for the summary
+        self.events_received = defaultdict(lambda: defaultdict(asyncio.Queue))
+        self.event_log = defaultdict(lambda: deque(maxlen=1024))
+        self.event_counts = Counter()
         self.tests_run = 0
         self.tests_passed = 0
         
@@ -20,66 +60,166 @@ class WebSocketTester:
         self.tests_run += 1
         if success:
             self.tests_passed += 1
-            print(f"✅ {name}")
+        if success:
+            line = f"✅ {name}\n   {details}" if details else f"✅ {name}"
         else:
-            print(f"❌ {name} - {details}")
-        
-        if details and success:
-            print(f"   {details}")
+            line = f"❌ {name} - {details}"
+        sys.stdout.write(line + "\n")
+
+    def _handle(self, event, client_id, data):
+        """Record a received event for _expect and the summary"""
+        self.events_received[client_id][event].put_nowait(data)
+        self._record(event, client_id, data)
+
+    def _record(self, event, client_id, data):
+        """Count an event and keep it in the bounded history for the summary"""
+        self.event_log[event].append((client_id, data))
+        self.event_counts[event] += 1
 
     def create_client(self, client_id):
         """Create a Socket.IO client"""
         try:
-            client = socketio.SimpleClient()
+            client = socketio.AsyncClient(json=SOCKET_JSON)
+            self.client_ids[client] = client_id
             
-            # Event handlers
-            def on_connect():
-                print(f"Client {client_id} connected")
-                
-            def on_disconnect():
-                print(f"Client {client_id} disconnected")
-                
-            def on_participant_joined(data):
-                self.events_received.append(f"Client {client_id} received participant_joined: {data}")
-                
-            def on_participant_left(data):
-                self.events_received.append(f"Client {client_id} received participant_left: {data}")
-                
-            def on_participant_updated(data):
-                self.events_received.append(f"Client {client_id} received participant_updated: {data}")
-                
-            def on_hand_raised(data):
-                self.events_received.append(f"Client {client_id} received hand_raised: {data}")
-                
-            def on_new_message(data):
-                self.events_received.append(f"Client {client_id} received new_message: {data}")
-                
-            def on_room_state(data):
-                self.events_received.append(f"Client {client_id} received room_state: {len(data.get('participants', []))} participants")
-            
-            # Register event handlers
-            client.on('connect', on_connect)
-            client.on('disconnect', on_disconnect)
-            client.on('participant_joined', on_participant_joined)
-            client.on('participant_left', on_participant_left)
-            client.on('participant_updated', on_participant_updated)
-            client.on('hand_raised', on_hand_raised)
-            client.on('new_message', on_new_message)
-            client.on('room_state', on_room_state)
+            for event in SOCKET_EVENTS:
+                client.on(event, partial(self._handle, event, client_id))
             
             return client
         except Exception as e:
             print(f"Failed to create client {client_id}: {str(e)}")
             return None
 
-    def test_connection_lifecycle(self):
+    async def _connect(self, client, socketio_path=None, wait_timeout=5):
+        """Connect straight over WebSocket, skipping the long-polling upgrade"""
+        await client.connect(
+            self.base_url,
+            socketio_path=socketio_path or self.socket_path,
+            transports=['websocket'],
+            wait=True,
+            wait_timeout=wait_timeout,
+            retry=False,
+        )
+
+    async def _connect_cycle(self, client_id):
+        """Open a fresh client and close it again shortly after"""
+        client = self.create_client(client_id)
+        await self._connect(client)
+        await asyncio.sleep(0.1)
+        await client.disconnect()
+
+    async def _spawn(self, i, room_id):
+        """Open a raw Engine.IO WebSocket, join the given room, and start draining it
+
+        Returns the socket, its drain task, and a future for the participant count in its room_state.
+        """
+        # The stress test only needs join_room and room_state, so it speaks the Socket.IO
+        # text protocol directly instead of paying for a full AsyncClient per connection
+        client_id = f"stress_{i}"
+        url = re.sub(r'^http', 'ws', self.base_url) + self.socket_path + '/?EIO=4&transport=websocket'
+        ws = await websockets.connect(url, compression=None)
+        try:
+            await ws.recv()  # Engine.IO OPEN
+            await ws.send('40')
+            if not (await ws.recv()).startswith('40'):
+                raise ConnectionError(f"{client_id} was refused by the default namespace")
+            await ws.send('42' + orjson.dumps(['join_room', {
+                'room_id': room_id,
+                'user_id': f'stress_user_{i}',
+                'name': f'Stress User {i}'
+            }]).decode())
+        except BaseException:
+            await ws.close()
+            raise
+        joined = asyncio.get_running_loop().create_future()
+        return ws, asyncio.create_task(self._drain(ws, client_id, joined)), joined
+
+    async def _drain(self, ws, client_id, joined):
+        """Answer Engine.IO pings and count events on a raw socket until it closes"""
+        # Nothing awaits individual stress events, so they skip the per-client queues; only
+        # the room_state size is kept, and the rest goes to the bounded summary history
+        try:
+            async for message in ws:
+                if message == '2':
+                    await ws.send('3')
+                elif message.startswith('42'):
+                    event, data = orjson.loads(message[2:])
+                    if event == 'room_state' and not joined.done():
+                        joined.set_result(len(data['participants']))
+                    if event in SOCKET_EVENTS:
+                        self._record(event, client_id, data)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _open_pool(self):
+        """Connect the shared client pool once for the whole run"""
+        self.clients = [self.create_client(f"pool_{i}") for i in range(POOL_SIZE)]
+        await asyncio.gather(*(self._connect(client) for client in self.clients))
+        self._idle = list(self.clients)
+        self._pool_ready = asyncio.Condition()
+
+    async def _close_pool(self):
+        """Disconnect the shared client pool"""
+        await asyncio.gather(*(client.disconnect() for client in self.clients), return_exceptions=True)
+
+    async def _borrow(self, n):
+        """Take n pooled clients at once, waiting until that many are idle"""
+        # All-or-nothing so concurrent suites can't each hold part of the pool and deadlock
+        async with self._pool_ready:
+            await self._pool_ready.wait_for(lambda: len(self._idle) >= n)
+            borrowed, self._idle = self._idle[:n], self._idle[n:]
+        return borrowed
+
+    async def _return(self, *clients):
+        """Leave every room the clients joined and hand them back to the pool"""
+        await asyncio.gather(*(
+            self._leave(client, room_id, user_id)
+            for client in clients
+            for room_id, user_id in list(self._joins[client])
+        ), return_exceptions=True)
+        async with self._pool_ready:
+            self._idle.extend(clients)
+            self._pool_ready.notify_all()
+
+    async def _join(self, client, payload):
+        """Join a room, remember it so the client can be reset later, and wait for its room_state"""
+        self._joins[client].append((payload['room_id'], payload['user_id']))
+        # Drop room_state left over from earlier joins so only this join's reply counts
+        self.events_received[self.client_ids[client]].pop('room_state', None)
+        await client.emit('join_room', payload)
+        return await self._expect(client, 'room_state')
+
+    async def _leave(self, client, room_id, user_id):
+        """Leave a room, waiting for the server to process it"""
+        self._joins[client].remove((room_id, user_id))
+        await client.call('leave_room', {'room_id': room_id, 'user_id': user_id}, timeout=5)
+
+    def _reset(self, *clients):
+        """Drop events already queued for these clients before triggering new ones"""
+        for client in clients:
+            self.events_received[self.client_ids[client]].clear()
+
+    async def _expect(self, client, event, n=1, timeout=2.0):
+        """Wait for up to n events of one type, returning as soon as they arrive"""
+        queue = self.events_received[self.client_ids[client]][event]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        received = []
+        try:
+            while len(received) < n:
+                received.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+        except asyncio.TimeoutError:
+            pass
+        return received
+
+    async def test_connection_lifecycle(self):
         """Test 1: Connection Lifecycle Testing"""
         print("\n🔍 Testing Connection Lifecycle...")
         
         # Test successful connection
         try:
             client = self.create_client("lifecycle_test")
-            client.connect(self.base_url, socketio_path=self.socket_path)
+            await self._connect(client)
             self.log_test("Socket.IO Connection", True, "Connected successfully")
             
             # Test connection status
@@ -89,8 +229,7 @@ class WebSocketTester:
                 self.log_test("Connection Status Check", False, "Client not connected")
             
             # Test disconnect
-            client.disconnect()
-            time.sleep(0.5)
+            await client.disconnect()
             
             if not client.connected:
                 self.log_test("Disconnect Event", True, "Client disconnected successfully")
@@ -100,42 +239,43 @@ class WebSocketTester:
         except Exception as e:
             self.log_test("Socket.IO Connection", False, f"Connection failed: {str(e)}")
             
-        # Test connection failure with wrong path
+        # Test connection failure with wrong path; a short wait keeps this from dominating the suite
+        client = self.create_client("wrong_path_test")
+        start_time = time.monotonic()
         try:
-            client = self.create_client("wrong_path_test")
-            client.connect(self.base_url, socketio_path='/wrong/path')
+            await self._connect(client, socketio_path='/wrong/path', wait_timeout=1)
             self.log_test("Wrong Path Connection", False, "Should have failed but didn't")
+        except (socketio.exceptions.ConnectionError, asyncio.TimeoutError) as e:
+            duration = time.monotonic() - start_time
+            if duration < 2.0:
+                self.log_test("Wrong Path Connection", True, f"Correctly failed in {duration:.2f}s: {str(e)}")
+            else:
+                self.log_test("Wrong Path Connection", False, f"Failure took too long: {duration:.2f}s")
         except Exception as e:
-            self.log_test("Wrong Path Connection", True, f"Correctly failed: {str(e)}")
+            self.log_test("Wrong Path Connection", False, f"Unexpected error: {str(e)}")
+        finally:
+            # A failed connect leaves the transport's HTTP session open; disconnect closes it
+            await client.disconnect()
 
-    def test_room_management(self):
+    async def test_room_management(self):
         """Test 2: Room Management Testing"""
         print("\n🔍 Testing Room Management...")
         
+        client1, client2 = await self._borrow(2)
         try:
-            # Create two clients
-            client1 = self.create_client("room_test_1")
-            client2 = self.create_client("room_test_2")
-            
-            client1.connect(self.base_url, socketio_path=self.socket_path)
-            client2.connect(self.base_url, socketio_path=self.socket_path)
-            
-            time.sleep(1)
-            
             # Test join_room with valid room_id
             test_room_id = "test_room_123"
-            client1.emit('join_room', {
+            await self._join(client1, {
                 'room_id': test_room_id,
                 'user_id': 'user_1',
                 'name': 'Test User 1'
             })
             
-            time.sleep(0.5)
             self.log_test("Join Room Valid ID", True, "Event emitted successfully")
             
             # Test join_room with missing room_id
             try:
-                client1.emit('join_room', {
+                await client1.emit('join_room', {
                     'user_id': 'user_1',
                     'name': 'Test User 1'
                 })
@@ -144,118 +284,89 @@ class WebSocketTester:
                 self.log_test("Join Room Missing ID", False, f"Error: {str(e)}")
             
             # Test multiple clients in same room
-            client2.emit('join_room', {
+            await self._join(client2, {
                 'room_id': test_room_id,
                 'user_id': 'user_2',
                 'name': 'Test User 2'
             })
             
-            time.sleep(1)
             self.log_test("Multiple Clients Same Room", True, "Both clients joined")
             
             # Test clients in different rooms
-            client2.emit('join_room', {
+            await self._join(client2, {
                 'room_id': 'different_room_456',
                 'user_id': 'user_2',
                 'name': 'Test User 2'
             })
             
-            time.sleep(0.5)
             self.log_test("Clients Different Rooms", True, "Client moved to different room")
             
-            # Cleanup
-            client1.disconnect()
-            client2.disconnect()
-            
         except Exception as e:
             self.log_test("Room Management", False, f"Error: {str(e)}")
+        finally:
+            await self._return(client1, client2)
 
-    def test_broadcasting_sync(self):
+    async def test_broadcasting_sync(self):
         """Test 3: Broadcasting & Real-time Sync Testing"""
         print("\n🔍 Testing Broadcasting & Real-time Sync...")
         
+        client1, client2 = await self._borrow(2)
         try:
-            # Create multiple clients
-            client1 = self.create_client("broadcast_1")
-            client2 = self.create_client("broadcast_2")
-            
-            client1.connect(self.base_url, socketio_path=self.socket_path)
-            client2.connect(self.base_url, socketio_path=self.socket_path)
-            
-            time.sleep(1)
-            
             # Join same room
             test_room_id = "broadcast_room"
-            client1.emit('join_room', {
-                'room_id': test_room_id,
-                'user_id': 'broadcast_user_1',
-                'name': 'Broadcast User 1'
-            })
+            await self._join(client1, BROADCAST_USERS[0])
+            await self._join(client2, BROADCAST_USERS[1])
             
-            client2.emit('join_room', {
-                'room_id': test_room_id,
-                'user_id': 'broadcast_user_2',
-                'name': 'Broadcast User 2'
-            })
-            
-            time.sleep(1)
-            
-            # Clear previous events
-            self.events_received.clear()
+            # Only look at events from here on
+            self._reset(client1, client2)
             
             # Test message broadcasting
-            client1.emit('send_message', {
+            await client1.emit('send_message', {
                 'room_id': test_room_id,
                 'user_id': 'broadcast_user_1',
                 'user_name': 'Broadcast User 1',
                 'content': 'Test broadcast message'
             })
             
-            time.sleep(1)
-            
             # Check if both clients received the message
-            message_events = [e for e in self.events_received if 'new_message' in e]
+            received = await asyncio.gather(self._expect(client1, 'new_message'), self._expect(client2, 'new_message'))
+            message_events = [event for events in received for event in events]
             if len(message_events) >= 1:
                 self.log_test("Message Broadcasting", True, f"Received {len(message_events)} message events")
             else:
                 self.log_test("Message Broadcasting", False, "No message events received")
             
             # Test real-time updates (mute status)
-            self.events_received.clear()
-            client1.emit('toggle_mute', {
+            self._reset(client1, client2)
+            await client1.emit('toggle_mute', {
                 'room_id': test_room_id,
                 'user_id': 'broadcast_user_1',
                 'is_muted': True
             })
             
-            time.sleep(1)
-            
-            update_events = [e for e in self.events_received if 'participant_updated' in e]
+            received = await asyncio.gather(self._expect(client1, 'participants_batch'), self._expect(client2, 'participants_batch'))
+            update_events = [event for events in received for event in events]
             if len(update_events) >= 1:
                 self.log_test("Real-time Updates", True, f"Received {len(update_events)} update events")
             else:
                 self.log_test("Real-time Updates", False, "No update events received")
             
-            # Cleanup
-            client1.disconnect()
-            client2.disconnect()
-            
         except Exception as e:
             self.log_test("Broadcasting & Sync", False, f"Error: {str(e)}")
+        finally:
+            await self._return(client1, client2)
 
-    def test_error_handling(self):
+    async def test_error_handling(self):
         """Test 4: Error Handling Testing"""
         print("\n🔍 Testing Error Handling...")
         
         try:
             client = self.create_client("error_test")
-            client.connect(self.base_url, socketio_path=self.socket_path)
-            
-            time.sleep(1)
+            await self._connect(client)
             
             # Test malformed room_id handling
             try:
-                client.emit('join_room', {
+                await client.emit('join_room', {
                     'room_id': None,
                     'user_id': 'error_user',
                     'name': 'Error User'
@@ -266,7 +377,7 @@ class WebSocketTester:
             
             # Test missing data in events
             try:
-                client.emit('send_message', {
+                await client.emit('send_message', {
                     'room_id': 'test_room'
                     # Missing content, user_id, user_name
                 })
@@ -276,12 +387,7 @@ class WebSocketTester:
             
             # Test rapid connect/disconnect cycles
             try:
-                for i in range(3):
-                    temp_client = self.create_client(f"rapid_{i}")
-                    temp_client.connect(self.base_url, socketio_path=self.socket_path)
-                    time.sleep(0.1)
-                    temp_client.disconnect()
-                    time.sleep(0.1)
+                await asyncio.gather(*(self._connect_cycle(f"rapid_{i}") for i in range(3)))
                 
                 self.log_test("Rapid Connect/Disconnect", True, "Handled multiple cycles")
             except Exception as e:
@@ -294,161 +400,296 @@ class WebSocketTester:
                 self.log_test("Connection Status Check Before Emit", False, "Client not connected")
             
             # Cleanup
-            client.disconnect()
+            await client.disconnect()
             
         except Exception as e:
             self.log_test("Error Handling", False, f"Error: {str(e)}")
 
-    def test_multi_user_collaboration(self):
+    async def test_multi_user_collaboration(self):
         """Test 5: Multi-user Collaboration Testing"""
         print("\n🔍 Testing Multi-user Collaboration...")
         
+        clients = await self._borrow(3)
         try:
-            # Create multiple clients for collaboration test
-            clients = []
-            for i in range(3):
-                client = self.create_client(f"collab_{i}")
-                client.connect(self.base_url, socketio_path=self.socket_path)
-                clients.append(client)
-            
-            time.sleep(1)
-            
             # All join same room
             test_room_id = "collaboration_room"
-            for i, client in enumerate(clients):
-                client.emit('join_room', {
-                    'room_id': test_room_id,
-                    'user_id': f'collab_user_{i}',
-                    'name': f'Collab User {i}'
-                })
+            for client, user in zip(clients, COLLAB_USERS):
+                await self._join(client, user)
             
-            time.sleep(2)
-            
-            # Clear events
-            self.events_received.clear()
+            # Only look at events from here on
+            self._reset(*clients)
             
             # Test concurrent updates (hand raising)
-            for i, client in enumerate(clients):
-                client.emit('raise_hand', {
-                    'room_id': test_room_id,
-                    'user_id': f'collab_user_{i}',
-                    'is_hand_raised': True
-                })
-                time.sleep(0.1)  # Small delay between actions
-            
-            time.sleep(2)
+            # emit encodes the payload before returning, so one dict can be reused per loop
+            payload = {'room_id': test_room_id, 'user_id': None, 'is_hand_raised': True}
+            for client, user in zip(clients, COLLAB_USERS):
+                payload['user_id'] = user['user_id']
+                await client.emit('raise_hand', payload)
+                await asyncio.sleep(0.1)  # Small delay between actions
             
             # Check for hand raise events
-            hand_events = [e for e in self.events_received if 'hand_raised' in e]
+            received = await asyncio.gather(*(self._expect(client, 'participants_batch', 3) for client in clients))
+            hand_events = [
+                update for batches in received for batch in batches for update in batch
+                if update.get('is_hand_raised')
+            ]
             if len(hand_events) >= 3:
                 self.log_test("Concurrent User Updates", True, f"Received {len(hand_events)} hand raise events")
             else:
                 self.log_test("Concurrent User Updates", False, f"Only received {len(hand_events)} events")
             
-            # Test user removal (disconnect one client)
-            clients[0].disconnect()
-            time.sleep(1)
+            # Test user removal (first user leaves the room)
+            await self._leave(clients[0], test_room_id, 'collab_user_0')
             
             # Test remaining users still receive updates
-            self.events_received.clear()
-            clients[1].emit('send_message', {
+            self._reset(*clients[1:])
+            await clients[1].emit('send_message', {
                 'room_id': test_room_id,
                 'user_id': 'collab_user_1',
                 'user_name': 'Collab User 1',
                 'content': 'Message after user left'
             })
             
-            time.sleep(1)
-            
-            message_events = [e for e in self.events_received if 'new_message' in e]
+            received = await asyncio.gather(*(self._expect(client, 'new_message') for client in clients[1:]))
+            message_events = [event for events in received for event in events]
             if len(message_events) >= 1:
                 self.log_test("Updates After User Removal", True, "Remaining users receive updates")
             else:
                 self.log_test("Updates After User Removal", False, "No updates received")
             
-            # Cleanup remaining clients
-            for client in clients[1:]:
-                if client.connected:
-                    client.disconnect()
-            
         except Exception as e:
             self.log_test("Multi-user Collaboration", False, f"Error: {str(e)}")
+        finally:
+            await self._return(*clients)
 
-    def test_performance(self):
+    async def test_performance(self):
         """Test 6: Performance Testing"""
         print("\n🔍 Testing Performance...")
         
+        client, = await self._borrow(1)
         try:
-            client = self.create_client("performance_test")
-            client.connect(self.base_url, socketio_path=self.socket_path)
-            
-            time.sleep(1)
-            
             # Join room
             test_room_id = "performance_room"
-            client.emit('join_room', {
+            await self._join(client, {
                 'room_id': test_room_id,
                 'user_id': 'perf_user',
                 'name': 'Performance User'
             })
             
-            time.sleep(1)
-            
-            # Test rapid successive updates
-            start_time = time.time()
-            for i in range(10):
-                client.emit('toggle_mute', {
-                    'room_id': test_room_id,
-                    'user_id': 'perf_user',
-                    'is_muted': i % 2 == 0
-                })
-                time.sleep(0.05)  # 50ms between updates
-            
-            end_time = time.time()
-            duration = end_time - start_time
+            # Test rapid successive updates, sent as one bulk_update instead of 10 toggle_mute emits;
+            # timed until the room's participants_batch carrying the final value comes back
+            self._reset(client)
+            start_ns = time.perf_counter_ns()
+            await client.emit('bulk_update', {
+                'room_id': test_room_id,
+                'user_id': 'perf_user',
+                'updates': [{'is_muted': i % 2 == 0} for i in range(10)]
+            })
+            batches = await self._expect(client, 'participants_batch', timeout=2.0)
+            duration = (time.perf_counter_ns() - start_ns) / 1e9
             
-            if duration < 2.0:  # Should complete within 2 seconds
-                self.log_test("Rapid Updates Performance", True, f"Completed in {duration:.2f}s")
+            if batches and batches[0][0].get('is_muted') is False:
+                self.log_test("Rapid Updates Performance", True, f"Final state broadcast in {duration:.2f}s")
+            elif batches:
+                self.log_test("Rapid Updates Performance", False, f"Broadcast carried is_muted={batches[0][0].get('is_muted')}, expected False")
             else:
-                self.log_test("Rapid Updates Performance", False, f"Took too long: {duration:.2f}s")
+                self.log_test("Rapid Updates Performance", False, "No participants_batch within 2s")
+            
+            # Test per-update round trip: the server echoes nothing back, so time each toggle
+            # until the sender's own participants_batch arrives (includes the 50ms batch window)
+            latencies = []
+            payload = {'room_id': test_room_id, 'user_id': 'perf_user', 'is_muted': False}
+            for i in range(LATENCY_SAMPLES):
+                payload['is_muted'] = i % 2 == 0
+                self._reset(client)
+                start_ns = time.perf_counter_ns()
+                await client.emit('toggle_mute', payload)
+                if await self._expect(client, 'participants_batch'):
+                    latencies.append(time.perf_counter_ns() - start_ns)
+            
+            if len(latencies) == LATENCY_SAMPLES:
+                p50 = statistics.median(latencies)
+                p99 = statistics.quantiles(latencies, n=100)[98]
+                details = f"p50 {p50 / 1e6:.1f}ms, p99 {p99 / 1e6:.1f}ms over {len(latencies)} updates"
+                self.log_test("Update Round-Trip Latency", p99 < 200_000_000, details)
+            else:
+                self.log_test("Update Round-Trip Latency", False, f"Only {len(latencies)}/{LATENCY_SAMPLES} updates came back")
             
             # Test multiple concurrent rooms (simulate with different room IDs)
             rooms = ['room_1', 'room_2', 'room_3']
+            payload = {'room_id': None, 'user_id': 'perf_user', 'name': 'Performance User'}
             for room in rooms:
-                client.emit('join_room', {
-                    'room_id': room,
-                    'user_id': 'perf_user',
-                    'name': 'Performance User'
-                })
-                time.sleep(0.1)
+                payload['room_id'] = room
+                await self._join(client, payload)
             
             self.log_test("Multiple Rooms", True, "Joined multiple rooms successfully")
             
-            # Cleanup
-            client.disconnect()
-            
         except Exception as e:
             self.log_test("Performance Testing", False, f"Error: {str(e)}")
+        finally:
+            await self._return(client)
 
-    def run_all_websocket_tests(self):
-        """Run all WebSocket tests"""
-        print("🔌 Starting WebSocket Test Suite")
-        print("=" * 50)
+    async def test_bulk_update_batching(self):
+        """Test 7: Bulk Update Batching"""
+        print("\n🔍 Testing Bulk Update Batching...")
+        
+        sender, observer = await self._borrow(2)
+        try:
+            test_room_id = "bulk_room"
+            await self._join(sender, {
+                'room_id': test_room_id,
+                'user_id': 'bulk_user_1',
+                'name': 'Bulk User 1'
+            })
+            await self._join(observer, {
+                'room_id': test_room_id,
+                'user_id': 'bulk_user_2',
+                'name': 'Bulk User 2'
+            })
+            
+            # Ten toggles in one event should reach the room as a single aggregate update
+            self._reset(observer)
+            await sender.emit('bulk_update', {
+                'room_id': test_room_id,
+                'user_id': 'bulk_user_1',
+                'updates': [{'is_muted': i % 2 == 0} for i in range(10)]
+            })
+            
+            # Ask for two so a second, unbatched update would be caught within the window
+            update_events = await self._expect(observer, 'participants_batch', 2, timeout=1.0)
+            if len(update_events) == 1 and update_events[0][0].get('is_muted') is False:
+                self.log_test("Bulk Update Batching", True, "10 updates fanned out as 1 participants_batch")
+            else:
+                self.log_test("Bulk Update Batching", False, f"Expected 1 aggregate update, got {len(update_events)}")
+            
+        except Exception as e:
+            self.log_test("Bulk Update Batching", False, f"Error: {str(e)}")
+        finally:
+            await self._return(sender, observer)
+
+    async def test_rejoin_on_new_socket(self):
+        """Test 8: Rejoin On A New Socket"""
+        print("\n🔍 Testing Rejoin On A New Socket...")
+        
+        observer, = await self._borrow(1)
+        old, new = self.create_client("rejoin_old"), self.create_client("rejoin_new")
+        try:
+            await asyncio.gather(self._connect(old), self._connect(new))
+            test_room_id = "rejoin_room"
+            await self._join(observer, {
+                'room_id': test_room_id,
+                'user_id': 'rejoin_observer',
+                'name': 'Rejoin Observer'
+            })
+            
+            # A reconnecting client re-emits join_room from its new socket before the old one drops
+            join = {'room_id': test_room_id, 'user_id': 'rejoin_user', 'name': 'Rejoin User'}
+            for client in (old, new):
+                await client.emit('join_room', join)
+                await self._expect(client, 'room_state')
+            
+            self._reset(observer)
+            await old.disconnect()
+            left = await self._expect(observer, 'participant_left', timeout=1.0)
+            if not left:
+                self.log_test("Rejoin Survives Old Disconnect", True, "Old socket's disconnect left the rejoined user in place")
+            else:
+                self.log_test("Rejoin Survives Old Disconnect", False, f"Old socket evicted {left[0].get('user_id')}")
+            
+            # The new socket also joins a second room; its disconnect must clear it from both
+            await new.emit('join_room', {**join, 'room_id': 'rejoin_room_2'})
+            await self._expect(new, 'room_state')
+            await new.disconnect()
+            left = await self._expect(observer, 'participant_left', timeout=1.0)
+            state = await self._join(observer, {
+                'room_id': 'rejoin_room_2',
+                'user_id': 'rejoin_observer',
+                'name': 'Rejoin Observer'
+            })
+            ghosts = [p for p in state[0]['participants'] if p['user_id'] == 'rejoin_user'] if state else []
+            if [event.get('user_id') for event in left] == ['rejoin_user'] and state and not ghosts:
+                self.log_test("Disconnect Leaves Every Room", True, "User removed from both rooms")
+            else:
+                self.log_test("Disconnect Leaves Every Room", False, f"participant_left: {len(left)}, ghosts in second room: {len(ghosts)}")
+            
+        except Exception as e:
+            self.log_test("Rejoin On New Socket", False, f"Error: {str(e)}")
+        finally:
+            await asyncio.gather(old.disconnect(), new.disconnect(), return_exceptions=True)
+            await self._return(observer)
+
+    async def test_concurrent_connections(self, n=STRESS_CLIENTS):
+        """Test 9: Concurrent Connections Stress Testing"""
+        print(f"\n🔍 Testing {n} Concurrent Connections...")
+        
+        # Each client holds a socket; lift the soft fd limit so the test hits the server, not ulimit
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < STRESS_NOFILE:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (STRESS_NOFILE if hard == resource.RLIM_INFINITY else min(hard, STRESS_NOFILE), hard))
+        
+        test_room_id = "stress_room"
+        results = await asyncio.gather(*(self._spawn(i, test_room_id) for i in range(n)), return_exceptions=True)
+        spawned = [result for result in results if not isinstance(result, BaseException)]
+        clients = [ws for ws, _, _ in spawned]
         
+        try:
+            if len(clients) == n:
+                self.log_test("Concurrent Connections", True, f"{n} clients connected")
+            else:
+                self.log_test("Concurrent Connections", False, f"Only {len(clients)}/{n} clients connected")
+            
+            # The last join the server processes sees every participant in its room_state; the
+            # N² participant_joined fan-out queues ahead of it, hence the generous bound
+            joins = [joined for _, _, joined in spawned]
+            if joins:
+                await asyncio.wait(joins, timeout=60.0)
+            largest = max((joined.result() for joined in joins if joined.done()), default=0)
+            if largest == len(clients):
+                self.log_test("Shared Room Join", True, f"room_state reported {largest} participants")
+            else:
+                self.log_test("Shared Room Join", False, f"room_state reported at most {largest}/{len(clients)} participants")
+            
+        except Exception as e:
+            self.log_test("Concurrent Connections", False, f"Error: {str(e)}")
+        finally:
+            await asyncio.gather(*(ws.close() for ws in clients), return_exceptions=True)
+            await asyncio.gather(*(reader for _, reader, _ in spawned), return_exceptions=True)
+
+    async def _run(self):
+        """Run the independent test suites concurrently on one event loop"""
         tests = [
             self.test_connection_lifecycle,
             self.test_room_management,
             self.test_broadcasting_sync,
             self.test_error_handling,
             self.test_multi_user_collaboration,
-            self.test_performance
+            self.test_performance,
+            self.test_bulk_update_batching,
+            self.test_rejoin_on_new_socket
         ]
         
-        for test in tests:
-            try:
-                test()
-            except Exception as e:
-                print(f"❌ Test {test.__name__} failed with exception: {str(e)}")
+        await self._open_pool()
+        try:
+            results = await asyncio.gather(*(test() for test in tests), return_exceptions=True)
+        finally:
+            await self._close_pool()
+        
+        for test, result in zip(tests, results):
+            if isinstance(result, Exception):
+                print(f"❌ Test {test.__name__} failed with exception: {str(result)}")
+        
+        # Run alone: N joins fan out N² broadcasts, which would starve the functional suites
+        try:
+            await self.test_concurrent_connections()
+        except Exception as e:
+            print(f"❌ Test test_concurrent_connections failed with exception: {str(e)}")
+
+    def run_all_websocket_tests(self):
+        """Run all WebSocket tests"""
+        print("🔌 Starting WebSocket Test Suite")
+        print("=" * 50)
+        
+        asyncio.run(self._run())
         
         # Print results
         print("\n" + "=" * 50)
@@ -457,10 +698,11 @@ class WebSocketTester:
         print(f"📈 Success Rate: {success_rate:.1f}%")
         
         # Print received events summary
-        if self.events_received:
-            print(f"\n📡 Events Received: {len(self.events_received)}")
-            for event in self.events_received[-5:]:  # Show last 5 events
-                print(f"   {event}")
+        if self.event_log:
+            print(f"\n📡 Events Received: {sum(self.event_counts.values())}")
+            for event, entries in self.event_log.items():
+                client_id, data = entries[-1]
+                print(f"   {event}: {self.event_counts[event]} (last to {client_id}: {repr(data)[:120]})")
         
         return self.tests_passed == self.tests_run
 